@@ -51,6 +51,8 @@ class Client(asyncore.dispatcher):
         self.outbox = collections.deque()
         # Save the text corpus.
         self.corpus = corpus
+        # Find the line ends once, instead of for every message.
+        self.endings = markov.analyse_endings(corpus)
 
     def say(self, message):
         """
@@ -98,7 +100,8 @@ class Client(asyncore.dispatcher):
 
         # Use the markov generator to create a response
         word = markov.get_last_word(msg)
-        markov_str = markov.markov_gen(word, True, 5, self.corpus)
+        markov_str = markov.markov_gen(word, True, 5, self.corpus,
+                                       self.endings)
         msg = ''
         msg = markov.add_string(msg, markov_str, True)
 
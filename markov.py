@@ -9,9 +9,12 @@ import re
 import json
 import random
 import argparse
-from collections import OrderedDict
+from collections import OrderedDict, deque
 
-__version__ = '0.0.6'
+__version__ = '0.0.7'
+
+# Last corpus analysed by markov_gen and its line ends.
+_endings_cache = (None, None)
 
 
 def prepare_word(text, word, newline):
@@ -51,7 +54,98 @@ def prepare_word(text, word, newline):
     return (word, False)
 
 
-def markov_gen(start_word=None, newline=True, n_words=1, corpus=None):
+def is_punctuation(word):
+    """
+    Return True if a word is punctuation, that does not count as a word.
+
+    :param word: Word from the corpus.
+    :type word: str
+    """
+    return (word.strip('\n') in ',.!?')
+
+
+def analyse_endings(corpus):
+    """
+    Find the ways to end a line from every word in a corpus.
+
+    Returns a dictionary with a tuple for each word, of the successors ending a
+    line, least used first, and the number of words needed to reach a line
+    end, infinity if there is no way to get there. Punctuation is not counted
+    as words, and is not used to end a line, as the generator would not count
+    it either.
+
+    :param corpus: Dictionary to use for text generation.
+    :type corpus: dict
+    """
+    endings = dict()
+    predecessors = dict()
+    ends = deque()
+
+    for word, successors in corpus.items():
+        terminals = [succ for succ, count in sorted(successors.items(),
+                                                    key=lambda x: x[1])
+                     if ('\n' in succ) and not is_punctuation(succ)]
+        if len(terminals) > 0:
+            endings[word] = (terminals, 1)
+            ends.append(word)
+        else:
+            endings[word] = (terminals, float('inf'))
+        for succ in successors:
+            predecessors.setdefault(succ, []).append(word)
+
+    # Walk backwards from the words that can end a line, until no distance
+    # can be made shorter.
+    while len(ends) > 0:
+        word = ends.popleft()
+        distance = word_cost(word, endings)
+        for prev in predecessors.get(word, []):
+            if endings[prev][1] > distance:
+                endings[prev] = (endings[prev][0], distance)
+                ends.append(prev)
+
+    return (endings)
+
+
+def cached_endings(corpus):
+    """
+    Return the line ends of a corpus, only analysing it if it was not the last
+    one analysed.
+
+    The corpus is not expected to change after it has been analysed.
+
+    :param corpus: Dictionary to use for text generation.
+    :type corpus: dict
+    """
+    global _endings_cache
+
+    # Keep the corpus itself, so that its id is not reused by another one.
+    if _endings_cache[0] is not corpus:
+        _endings_cache = (corpus, analyse_endings(corpus))
+    return (_endings_cache[1])
+
+
+def word_cost(word, endings):
+    """
+    Return the number of words needed to reach a line end by adding a word.
+
+    :param word: Word from the corpus.
+    :type word: str
+    :param endings: Dictionary created by analyse_endings.
+    :type endings: dict
+    """
+    if '\n' in word:
+        if is_punctuation(word):
+            return (float('inf'))
+        return (1)
+    if word not in endings:
+        return (float('inf'))
+    if is_punctuation(word):
+        return (endings[word][1])
+    return (endings[word][1] + 1)
+
+
+def markov_gen(start_word=None, newline=True, n_words=1, corpus=None,
+               endings=None):
     """
     Generate a string.
 
@@ -63,10 +157,16 @@ def markov_gen(start_word=None, newline=True, n_words=1, corpus=None):
     :type n_words: int
     :param corpus: Dictionary to use for text generation.
     :type corpus: dict
+    :param endings: Line ends of the corpus from analyse_endings, created
+                    once per corpus if None.
+    :type endings: dict or None
     """
     if corpus is None:
         exit('No word corpus.')
 
+    if endings is None:
+        endings = cached_endings(corpus)
+
     # Pick a random word if there is nowhere else to start.
     if (start_word is None) or (start_word.strip() == ''):
         last_word = random.choice(list(corpus.keys()))
@@ -98,17 +198,26 @@ def markov_gen(start_word=None, newline=True, n_words=1, corpus=None):
                 # Make a list of words from it.
                 word_list = list(word_dict.keys())
                 # If this is the last word in the sentence prefer words that
-                # statistically has few words following it
+                # end the line.
                 if n_words == 1:
-                    if len(word_list) > 1:
-                        for word in word_list:
-                            if '\n' not in word:
-                                word_list.remove(word)
+                    if len(endings[last_word][0]) > 0:
+                        word_list = list(endings[last_word][0])
+                else:
+                    # Otherwise prefer words that can still reach a line end
+                    # within the words left, without ending the line early.
+                    reachable = [word for word in word_list
+                                 if word_cost(word, endings) <= n_words]
+                    continuing = [word for word in reachable
+                                  if '\n' not in word]
+                    if len(continuing) > 0:
+                        word_list = continuing
+                    elif len(reachable) > 0:
+                        word_list = reachable
                 if (len(word_list) > 0):
                     # Most used first.
                     word_list.reverse()
                     # Get a random index into the list
-                    widx = random.randint(0, len(word_dict) - 1)
+                    widx = random.randint(0, len(word_list) - 1)
                     if widx == 0:
                         word = word_list[0]
                     else:
@@ -182,6 +291,7 @@ def main():
     random.seed()
     # Load JSON Markov seed corpus.
     corpus = json.load(args.corpusfile)
+    endings = analyse_endings(corpus)
 
     if args.tpl_file is not None:
         # Load a template file.
@@ -221,7 +331,8 @@ def main():
                     print('Generating ' + str(value) + ' words.')
                 # Keep a list of generated block.
                 # Insert Markov string.
-                blocks.append(markov_gen(last_word, newline, value, corpus))
+                blocks.append(markov_gen(last_word, newline, value, corpus,
+                                         endings))
                 text = add_string(text, blocks[-1], capitalize)
             else:
                 # Insert previous string.
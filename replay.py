@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Replay recorded chat traffic against a server.
+
+:copyright: (c) 2017 by Martin Grønholdt.
+:license: GPLv3, see LICENSE for more details.
+"""
+
+import argparse
+import asyncore
+import collections
+import logging
+import socket
+import time
+
+import traffic
+
+# Default server address and port
+HOST = 'localhost'
+PORT = 1984
+
+
+class ReplayClient(asyncore.dispatcher):
+    """
+    Client that sends recorded messages for one connection.
+    """
+
+    def __init__(self, host_address, conn_id):
+        """
+        Constructor.
+
+        :param host_address: Address of the chat server
+        :param conn_id: Id of the simulated connection.
+        """
+        # Base class constructor.
+        asyncore.dispatcher.__init__(self)
+
+        # Set logger.
+        self.log = logging.getLogger('ReplayClient (%4d)' % conn_id)
+        # Create a new socket.
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+
+        self.log.info('Connecting to host at %s', host_address)
+        # Connect to the server
+        self.connect(host_address)
+        # Create the output message queue.
+        self.outbox = collections.deque()
+        # Close when everything is sent.
+        self.closing = False
+        # Number of messages sent and received.
+        self.n_sent = 0
+        self.n_received = 0
+        # Last time anything was sent or received.
+        self.last_active = time.time()
+
+    def say(self, message):
+        """
+        Queue a message for the server.
+
+        :param message: Message.
+        """
+        self.outbox.append(bytes(message + '@', 'UTF-8'))
+
+    def hang_up(self):
+        """
+        Close the connection once it is up and all queued messages are sent.
+        """
+        self.closing = True
+        if self.connected and (len(self.outbox) == 0):
+            self.close()
+
+    def handle_connect(self):
+        """
+        Close right away if told to while connecting, with nothing to send.
+        """
+        if self.closing and (len(self.outbox) == 0):
+            self.close()
+
+    def writable(self):
+        """
+        Only ask for write events when there is something to send.
+        """
+        return (not self.connected) or (len(self.outbox) > 0)
+
+    def handle_write(self):
+        """
+        Send as much of the next queued message as the socket will take.
+        """
+        # Nothing to send right after connecting.
+        if len(self.outbox) == 0:
+            return
+
+        message = self.outbox[0]
+        sent = self.send(message)
+        self.last_active = time.time()
+        if sent < len(message):
+            # Keep the rest for the next write.
+            self.outbox[0] = message[sent:]
+        else:
+            self.outbox.popleft()
+            self.n_sent += 1
+            if self.closing and (len(self.outbox) == 0):
+                self.close()
+
+    def handle_read(self):
+        """
+        Count the messages broadcast by the server.
+        """
+        self.n_received += self.recv(4096).count(b'@')
+        self.last_active = time.time()
+
+    def handle_close(self):
+        """
+        Drop what is left to send if the server closes the connection.
+        """
+        self.outbox.clear()
+        self.close()
+
+    def handle_error(self):
+        """
+        Raise an exception on error.
+        """
+        raise
+
+
+def replay(records, host_address, fast=False, copies=1, idle=1.0):
+    """
+    Send recorded messages to a server.
+
+    :param records: Records read from a traffic log.
+    :param host_address: Address of the chat server.
+    :param fast: Send as fast as possible instead of at the original timing.
+    :param copies: Number of simulated connections per recorded connection.
+    :param idle: Seconds without traffic before the server is done replying.
+    :return: List of the ReplayClient instances used.
+
+    In fast mode connections are only closed after the server has gone quiet,
+    instead of when they were closed in the recording.
+    """
+    clients = dict()
+    # Connections to close after the server has gone quiet.
+    closing = list()
+    # Messages sent by the server are not replayed.
+    records = [record for record in records if record.kind != traffic.SENT]
+    if len(records) == 0:
+        return ([])
+
+    start = time.time()
+    first = records[0].timestamp
+    # Time between server sessions, which is skipped.
+    offset = 0
+    session = 0
+    prev = first
+    for record in records:
+        if record.kind == traffic.SESSION:
+            # Connection ids start over in a new session.
+            session += 1
+            offset += record.timestamp - prev
+        prev = record.timestamp
+
+        if not fast:
+            # Keep the event loop running until it is time for this record.
+            at = record.timestamp - first - offset
+            delay = at - (time.time() - start)
+            while delay > 0:
+                if len(asyncore.socket_map) > 0:
+                    asyncore.loop(timeout=delay, count=1)
+                else:
+                    # Nothing connected, asyncore.loop would return at once.
+                    time.sleep(delay)
+                delay = at - (time.time() - start)
+
+        if record.kind == traffic.SESSION:
+            continue
+
+        for copy in range(copies):
+            key = (session, record.conn_id, copy)
+            # Connect on the accept, or the first message if that was missed.
+            if key not in clients:
+                if record.kind == traffic.CLOSE:
+                    continue
+                clients[key] = ReplayClient(host_address, len(clients) + 1)
+            if record.kind == traffic.RECEIVED:
+                clients[key].say(record.message)
+            elif record.kind == traffic.CLOSE:
+                if fast:
+                    # Stay connected to get the replies to everybody else.
+                    closing.append(clients[key])
+                else:
+                    clients[key].hang_up()
+
+    # Wait for everything to be sent, and for the server to stop replying.
+    while len(asyncore.socket_map) > 0:
+        if any([len(client.outbox) > 0 for client in clients.values()]):
+            quiet = 0
+        else:
+            quiet = time.time() - max([client.last_active
+                                       for client in clients.values()])
+        if quiet >= idle:
+            break
+        asyncore.loop(timeout=min(0.1, idle - quiet), count=1)
+
+    for client in closing:
+        client.hang_up()
+
+    return (list(clients.values()))
+
+
+def main():
+    """
+    Main code.
+    """
+    logging.basicConfig(level=logging.ERROR)
+
+    # Parse command line
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('-a', '--address',
+                            type=str, dest='host', default=HOST,
+                            help='Host name or address of the chat server ({}).'.format(
+                                HOST))
+    arg_parser.add_argument('-p', '--port', type=int,
+                            dest='port', default=PORT,
+                            help='Port of the chat server ({}).'.format(PORT))
+    arg_parser.add_argument('-f', '--fast', action='store_true',
+                            dest='fast', default=False,
+                            help='Send as fast as possible.')
+    arg_parser.add_argument('-c', '--copies', type=int,
+                            dest='copies', default=1,
+                            help='Connections per recorded connection (1).')
+    arg_parser.add_argument('-i', '--idle', type=float,
+                            dest='idle', default=1.0,
+                            help='Seconds to wait for replies after the last '
+                                 'message (1.0).')
+    arg_parser.add_argument('log_file', type=argparse.FileType('rb'),
+                            help='Traffic log recorded by the server.')
+    args = arg_parser.parse_args()
+
+    start = time.time()
+    clients = replay(traffic.read_log(args.log_file), (args.host, args.port),
+                     args.fast, args.copies, args.idle)
+    # Time until the server went quiet, not including the idle wait.
+    if len(clients) > 0:
+        elapsed = max([client.last_active for client in clients]) - start
+    else:
+        elapsed = 0
+
+    n_sent = sum([client.n_sent for client in clients])
+    n_received = sum([client.n_received for client in clients])
+    print('{} connections, {} messages sent, {} received in {:.2f} s'.format(
+        len(clients), n_sent, n_received, elapsed))
+
+    for client in clients:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,44 +7,113 @@ Save word association statistics as JSON data
 """
 import json
 import re
+import sys
+import random
+import timeit
 import argparse
 
+import markov
 
-__version__ = '0.0.5'
 
+__version__ = '0.0.6'
 
-def main():
+
+def prune(words, min_count=1, top_k=None):
     """
-    Create a dictionary of word associations for later use in a markov
-    generator and save it as a file.
+    Remove rare transitions from a corpus.
+
+    :param words: Corpus dictionary of word associations.
+    :type words: dict
+    :param min_count: Drop transitions seen fewer times than this.
+    :type min_count: int
+    :param top_k: Keep only this many of the most used successors per word,
+                  all if None.
+    :type top_k: int or None
+    """
+    ret = dict()
+    for word, successors in words.items():
+        # Most used first, ties in alphabetical order to stay deterministic.
+        kept = sorted([(succ, count) for succ, count in successors.items()
+                       if count >= min_count],
+                      key=lambda x: (-x[1], x[0]))
+        if top_k is not None:
+            kept = kept[0:top_k]
+        if len(kept) > 0:
+            ret[word] = dict(kept)
+    return (ret)
+
+
+def collapse_dead_ends(words):
+    """
+    Remove transitions to words that can not be continued from.
+
+    A successor that does not end a line, and has no successors itself, makes
+    the generator restart from a random word. Transitions to such words are
+    removed, unless it is the only way to go. No word is removed, so a single
+    pass finds all of them.
+
+    :param words: Corpus dictionary of word associations.
+    :type words: dict
+    """
+    ret = dict()
+    for word, successors in words.items():
+        alive = {succ: count for succ, count in successors.items()
+                 if ('\n' in succ) or (succ in words)}
+        # Keep at least something to say.
+        if len(alive) == 0:
+            alive = dict(successors)
+        ret[word] = alive
+    return (ret)
+
+
+def report(name, words, n_gen=1000):
+    """
+    Print size, load time and generation speed of a corpus to stderr.
+
+    :param name: Name to print along the numbers.
+    :type name: str
+    :param words: Corpus dictionary of word associations.
+    :type words: dict
+    :param n_gen: Number of words to generate when timing the generator.
+    :type n_gen: int
+    """
+    data = json.dumps(words, ensure_ascii=False, indent=4, sort_keys=True)
+    n_transitions = sum([len(successors) for successors in words.values()])
+    load_time = min(timeit.repeat(lambda: json.loads(data), number=1,
+                                  repeat=5))
+    endings = markov.analyse_endings(words)
+    # Same seed for every run and corpus to compare like with like.
+    gen_time = min(timeit.repeat(lambda: markov.markov_gen(None, True, n_gen,
+                                                           words, endings),
+                                 setup=lambda: random.seed(0),
+                                 number=1, repeat=5))
+    print('{}: {} words, {} transitions, {} bytes, '
+          'loads in {:.2f} ms, {:.0f} words/s'.format(
+              name, len(words), n_transitions, len(data.encode('UTF-8')),
+              load_time * 1000, n_gen / gen_time), file=sys.stderr)
+
+
+def parse(corpusfile, name, verbose=False):
+    """
+    Create a dictionary of word associations from the dialogue of a character.
+
+    :param corpusfile: Text file to process.
+    :type corpusfile: file
+    :param name: Name of the character in the text.
+    :type name: str
+    :param verbose: Be verbose.
+    :type verbose: Boolean
     """
-    # Parse command line
-    arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument("-o", "--output", type=argparse.FileType('w'),
-                            dest="outfile", default=None,
-                            help="Write output to a this file.")
-    arg_parser.add_argument('-c', '--character', type=str, dest='name',
-                            default='Jul')
-    arg_parser.add_argument("-v", "--verbose",
-                            action="store_true", dest="verbose", default=False,
-                            help="Be verbose.")
-    arg_parser.add_argument("corpusfile", type=argparse.FileType('r'),
-                            help="Text file to process.")
-    args = arg_parser.parse_args()
     n_words = 0
     n_lines = 0
     words = dict()
     prev = None
-    text = ''
-
-    if args.corpusfile is None:
-        exit('Error reading input file.')
 
     corpus = ''
     add_line = False
 
     # Find and parse dialogue of the selected character.
-    for line in args.corpusfile.readlines():
+    for line in corpusfile.readlines():
         line = line.lstrip()
 
         # End of dilaogue
@@ -57,8 +126,8 @@ def main():
             corpus += line
 
         # Beginning of dialogue.
-        if line.startswith(args.name + '.'):
-            corpus += line.replace(args.name + '. ', '')
+        if line.startswith(name + '.'):
+            corpus += line.replace(name + '. ', '')
             add_line = True
 
     # Isolate tokens and run through them.
@@ -85,7 +154,7 @@ def main():
                         # Don't link to last word of previous line.
                         prev = None
                         n_lines += 1
-                        if args.verbose:
+                        if verbose:
                             print('.', end='')
                     else:
                         # No new line, just save the current word.
@@ -94,6 +163,72 @@ def main():
                     # No previous word use current.
                     prev = word
 
+    if verbose:
+        print("Total lines found: " + str(n_lines))
+        print("Total words found: " + str(n_words))
+
+    return (words)
+
+
+def main():
+    """
+    Create a dictionary of word associations for later use in a markov
+    generator and save it as a file.
+    """
+    # Parse command line
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("-o", "--output", type=argparse.FileType('w'),
+                            dest="outfile", default=None,
+                            help="Write output to a this file.")
+    arg_parser.add_argument('-c', '--character', type=str, dest='name',
+                            default='Jul')
+    arg_parser.add_argument("-j", "--json",
+                            action="store_true", dest="json", default=False,
+                            help="Input is an already generated corpus.")
+    arg_parser.add_argument("-m", "--min-count", type=int, dest="min_count",
+                            default=1,
+                            help="Drop transitions seen fewer times (1).")
+    arg_parser.add_argument("-k", "--top-k", type=int, dest="top_k",
+                            default=None,
+                            help="Keep only the K most used successors.")
+    arg_parser.add_argument("-d", "--collapse", action="store_true",
+                            dest="collapse", default=False,
+                            help="Remove transitions to dead end words.")
+    arg_parser.add_argument("-r", "--report",
+                            action="store_true", dest="report", default=False,
+                            help="Compare size and speed with the full "
+                                 "corpus, on stderr.")
+    arg_parser.add_argument("-v", "--verbose",
+                            action="store_true", dest="verbose", default=False,
+                            help="Be verbose.")
+    arg_parser.add_argument("corpusfile", type=argparse.FileType('r'),
+                            help="Text file to process.")
+    args = arg_parser.parse_args()
+
+    if args.min_count < 1:
+        arg_parser.error('--min-count must be at least 1.')
+    if (args.top_k is not None) and (args.top_k < 1):
+        arg_parser.error('--top-k must be at least 1.')
+
+    if args.corpusfile is None:
+        exit('Error reading input file.')
+
+    if args.json:
+        # Already generated, only prune.
+        words = json.load(args.corpusfile)
+    else:
+        words = parse(args.corpusfile, args.name, args.verbose)
+
+    full = words
+    # Make it smaller.
+    if (args.min_count > 1) or (args.top_k is not None):
+        words = prune(words, args.min_count, args.top_k)
+    if args.collapse:
+        words = collapse_dead_ends(words)
+
+    if len(words) == 0:
+        exit('Nothing left of the corpus after pruning.')
+
     # Save as JSON.
     if args.outfile is not None:
         json.dump(words, args.outfile, ensure_ascii=False, indent=4,
@@ -102,9 +237,10 @@ def main():
         print(json.dumps(words, ensure_ascii=False, indent=4,
                          sort_keys=True))
 
-    if args.verbose:
-        print("Total lines found: " + str(n_lines))
-        print("Total words found: " + str(n_words))
+    if args.report:
+        report('Full', full)
+        report('Pruned', words)
+
 
 if __name__ == '__main__':
     main()
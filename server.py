@@ -9,8 +9,11 @@ Server for a markov chain chat bot.
 import asyncore
 import collections
 import logging
+import signal
 import socket
+import sys
 import markov
+import traffic
 import argparse
 
 # Default server address and port
@@ -26,18 +29,22 @@ class RemoteClient(asyncore.dispatcher):
     # Set up logging
     log = logging.getLogger('RemoteClient')
 
-    def __init__(self, host, socket):
+    def __init__(self, host, socket, conn_id=0):
         """
         Constructor
 
         :param host: Server object
         :param socket: Remote socket
+        :param conn_id: Id of the connection in traffic recordings.
         """
         asyncore.dispatcher.__init__(self, socket)
         # Save server instance.
         self.host = host
+        self.conn_id = conn_id
         # Create the output message queue.
         self.outbox = collections.deque()
+        # Received data not yet ending in an EOM.
+        self.inbox = b''
 
     def say(self, message):
         """
@@ -50,35 +57,41 @@ class RemoteClient(asyncore.dispatcher):
 
     def handle_read(self):
         """
-        Read a message from the server and broadcast the last word as seed.
+        Read messages from the server and broadcast the last word as seed.
         """
-        # Get startet
-        msg = ''
-        data = self.recv(1024).decode('UTF-8')
+        self.inbox += self.recv(1024)
 
-        # Receive message data until an 'End Of Massage' character.
-        while '@' not in data:
-            msg += data
-            data = self.recv(1024).decode('UTF-8')
+        # Handle every message up until the last 'End Of Massage' character,
+        # keep the rest for later.
+        *messages, self.inbox = self.inbox.split(b'@')
+        for msg in messages:
+            msg = msg.decode('UTF-8')
+            self.log.info('Recieved: {}'.format(msg))
+            if self.host.recorder is not None:
+                self.host.recorder.record(self.conn_id, traffic.RECEIVED, msg)
 
-        # Isolate data up until the EOM.
-        for ch in data:
-            if ch == '@':
-                self.log.info('Recieved: {}'.format(msg))
-                break
-            msg += ch
+            # Remove newlines at the end.
+            if msg.endswith('\n'):
+                msg = msg[0:-1]
 
-        # Remove newlines at the end.
-        if msg.endswith('\n'):
-            msg = msg[0:-1]
+            # Print the message.
+            print(msg)
 
-        # Print the message.
-        print(msg)
+            # Get last word.
+            word = markov.get_last_word(msg)
+            # Broadcast as seed.
+            self.host.broadcast(self, word)
 
-        # Get last word.
-        word = markov.get_last_word(msg)
-        # Broadcast as seed.
-        self.host.broadcast(self, word)
+    def handle_close(self):
+        """
+        Forget about the client when it disconnects.
+        """
+        self.log.info('Client disconnected')
+        if self.host.recorder is not None:
+            self.host.recorder.record(self.conn_id, traffic.CLOSE)
+        if self in self.host.remote_clients:
+            self.host.remote_clients.remove(self)
+        self.close()
 
     def handle_write(self):
         """
@@ -92,6 +105,8 @@ class RemoteClient(asyncore.dispatcher):
 
         # Get a queued item.
         message = self.outbox.popleft()
+        if self.host.recorder is not None:
+            self.host.recorder.record(self.conn_id, traffic.SENT, message)
         # Add EOM character
         message += '@'
         # Send message.
@@ -106,21 +121,26 @@ class Host(asyncore.dispatcher):
     # Set up logging
     log = logging.getLogger('Host')
 
-    def __init__(self, address):
+    def __init__(self, address, recorder=None):
         """
         Constructor
 
         :param address: Server address
+        :param recorder: traffic.Recorder to log all messages to, or None.
         """
         asyncore.dispatcher.__init__(self)
         # Create a new socket.
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         # Bind to the address
         self.bind(address)
-        # Act like a server and listen
-        self.listen(1)
+        # Act like a server and listen, with room for many clients connecting
+        # at once.
+        self.listen(socket.SOMAXCONN)
         # List of connected clients
         self.remote_clients = []
+        # Traffic recording.
+        self.recorder = recorder
+        self.n_accepted = 0
 
     def handle_accept(self):
         """
@@ -128,8 +148,12 @@ class Host(asyncore.dispatcher):
         """
         socket, addr = self.accept()
         self.log.info('Accepted client at {}:{}'.format(addr[0], addr[1]))
+        self.n_accepted += 1
+        if self.recorder is not None:
+            self.recorder.record(self.n_accepted, traffic.ACCEPT)
         # Create and store a RemoteClient instance.
-        self.remote_clients.append(RemoteClient(self, socket))
+        self.remote_clients.append(RemoteClient(self, socket,
+                                                self.n_accepted))
 
     def handle_read(self):
         """
@@ -172,14 +196,27 @@ def main():
     arg_parser.add_argument('-p', '--port', type=int,
                             dest='port', default=PORT,
                             help='Port of the chat server ({}).'.format(PORT))
+    arg_parser.add_argument('-r', '--record', type=str,
+                            dest='record', default=None,
+                            help='Append all traffic to this log file.')
     args = arg_parser.parse_args()
 
+    recorder = None
+    if args.record is not None:
+        recorder = traffic.Recorder(args.record)
+        # Exit normally when terminated, to write the last records.
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     logging.info('Creating host')
     # Instantiate the server.
-    host = Host((args.host, args.port))
+    host = Host((args.host, args.port), recorder)
     # Enter the event loop
     logging.info('Looping')
-    asyncore.loop()
+    try:
+        asyncore.loop()
+    finally:
+        if recorder is not None:
+            recorder.close()
 
 
 if __name__ == "__main__":
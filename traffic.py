@@ -0,0 +1,134 @@
+"""
+Record and read chat traffic logs.
+
+Every record is a small binary header followed by the message:
+
+    timestamp (double), connection id (uint32), kind (char), length (uint32)
+
+:copyright: (c) 2017 by Martin Grønholdt.
+:license: GPLv3, see LICENSE for more details.
+"""
+
+import collections
+import logging
+import queue
+import struct
+import threading
+import time
+
+# Record header.
+HEADER = struct.Struct('<dIcI')
+
+# Record kinds.
+SESSION = b'N'
+ACCEPT = b'A'
+RECEIVED = b'R'
+SENT = b'S'
+CLOSE = b'C'
+
+# Write records to disk when there are this many bytes of them.
+BUFFER_SIZE = 64 * 1024
+# Longest time in seconds to keep records before writing them.
+FLUSH_INTERVAL = 1.0
+
+Record = collections.namedtuple('Record', 'timestamp conn_id kind message')
+
+
+class Recorder(object):
+    """
+    Append traffic records to a log file.
+
+    Connection ids start over in every server session, so every recorder
+    starts by adding a SESSION record.
+
+    Records are handed to a writer thread through a queue, so the event loop
+    never waits for the disk. The writer collects them and writes when it has
+    a buffer full, or at least every flush_interval seconds.
+    """
+
+    # Set up logging
+    log = logging.getLogger('Recorder')
+
+    def __init__(self, filename, buffer_size=BUFFER_SIZE,
+                 flush_interval=FLUSH_INTERVAL):
+        """
+        Constructor
+
+        :param filename: Log file to append to.
+        :param buffer_size: Bytes to buffer before writing.
+        :param flush_interval: Longest time in seconds to keep records before
+                               writing.
+        """
+        self.file = open(filename, 'ab')
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        # Records waiting for the writer, None tells it to stop.
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.write_records,
+                                       name='Recorder', daemon=True)
+        self.writer.start()
+        self.record(0, SESSION)
+
+    def record(self, conn_id, kind, message=''):
+        """
+        Add a record to the log.
+
+        :param conn_id: Id of the connection.
+        :param kind: SESSION, ACCEPT, RECEIVED, SENT or CLOSE.
+        :param message: Message without the EOM character.
+        """
+        data = bytes(message, 'UTF-8')
+        self.queue.put(HEADER.pack(time.time(), conn_id, kind, len(data)) +
+                       data)
+
+    def write_records(self):
+        """
+        Write records from the queue to the log file, until told to stop.
+        """
+        buffer = bytearray()
+        deadline = time.time() + self.flush_interval
+        running = True
+        while running:
+            try:
+                data = self.queue.get(timeout=max(0,
+                                                  deadline - time.time()))
+                if data is None:
+                    running = False
+                else:
+                    buffer += data
+            except queue.Empty:
+                pass
+
+            if ((not running) or (len(buffer) >= self.buffer_size) or
+                    (time.time() >= deadline)):
+                if len(buffer) > 0:
+                    self.log.info('Writing %d bytes', len(buffer))
+                    self.file.write(buffer)
+                    self.file.flush()
+                    buffer = bytearray()
+                deadline = time.time() + self.flush_interval
+
+        self.file.close()
+
+    def close(self):
+        """
+        Write what is left and close the log file.
+        """
+        self.queue.put(None)
+        self.writer.join()
+
+
+def read_log(log_file):
+    """
+    Read all records from a traffic log.
+
+    :param log_file: Log file opened in binary mode.
+    :return: Generator of Record tuples.
+    """
+    while True:
+        header = log_file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+        timestamp, conn_id, kind, length = HEADER.unpack(header)
+        message = log_file.read(length).decode('UTF-8')
+        yield Record(timestamp, conn_id, kind, message)